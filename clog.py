@@ -1,91 +1,230 @@
+import contextlib
 import csv
 import datetime
-import mailbox
+import functools
+import itertools
+import logging
+import mmap
+import multiprocessing
+import os
 import re
+import sys
+import threading
 import timeit
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from email.errors import HeaderParseError
 from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from email.utils import parseaddr, parsedate_to_datetime
+from operator import attrgetter
 
 import arrow
+import numpy
 from flanker.addresslib import address
 from gooey import Gooey, GooeyParser
 
 from filters import load_filters
 
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_SIZE = 1 << 20
+WRITE_BATCH_SIZE = 1000
+PARALLEL_THRESHOLD = 10000
+PROGRESS_INTERVAL = 1
+# ProcessPoolExecutor rejects more workers than this on Windows
+WINDOWS_MAX_WORKERS = 61
+
+_WS_RE = re.compile(r"\s{2,}")
+_NEEDS_CLEANING_RE = re.compile(r"=\?|\s\s")
+
+# Common From header forms: a bare address, or an optional plain or quoted
+# display name followed by <address>. Anything else goes to parseaddr/flanker.
+_ATOM = r'[^\s"<>@,;:\\()\[\]]+'
+_ADDRESS_RE = re.compile(
+    rf'\s*(?:(?:"(?P<quoted>[^"\\]*)"|(?P<name>{_ATOM}(?: {_ATOM})*))?\s*'
+    rf"<(?P<bracketed>{_ATOM}@{_ATOM})>|(?P<bare>{_ATOM}@{_ATOM}))\s*"
+)
+
+_HEADER_PARSER = BytesHeaderParser()
+
+
+# Shared parser so each arrow format's compiled regex is cached across emails,
+# unlike arrow.get which builds a fresh parser per call
+_ARROW_PARSER = arrow.parser.DateTimeParser("en_us", cache_size=32)
+
+# Fallback parsers for Date headers that aren't RFC 2822, as (parser, format)
+# pairs. strptime's %a and %b use the current LC_TIME locale, so they only match
+# English names under the default C locale; the arrow formats always do.
+_DATE_FORMATS = (
+    (datetime.datetime.strptime, "%a, %d %b %Y %H:%M:%S %z"),
+    (datetime.datetime.strptime, "%a, %d %b %Y %H:%M:%S"),
+    (datetime.datetime.strptime, "%a %d %b %Y %H:%M:%S %z"),
+    (datetime.datetime.strptime, "%d %b %Y %H:%M:%S %z"),
+    (datetime.datetime.strptime, "%a, %d %b %Y %H:%M %z"),
+    (datetime.datetime.strptime, "%m/%d/%y, %H:%M"),
+    (datetime.datetime.strptime, "%d %b %Y %H:%M:%S"),
+    (_ARROW_PARSER.parse, r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]Z"),
+    (_ARROW_PARSER.parse, r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]ZZZ"),
+    (_ARROW_PARSER.parse, r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]"),
+    (_ARROW_PARSER.parse, r"ddd,[\s+]DD[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss"),
+    (_ARROW_PARSER.parse, r"ddd[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]Z"),
+    (_ARROW_PARSER.parse, r"D[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss[\s+]Z"),
+    (_ARROW_PARSER.parse, r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm[\s+]Z"),
+    (_ARROW_PARSER.parse, r"MM/D/YY,[\s+]H[\s+]mm[.*]"),
+    (_ARROW_PARSER.parse, r"M/D/YY,[\s+]H:m"),
+    (_ARROW_PARSER.parse, r"DD[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss"),
+    (_ARROW_PARSER.parse, r"MM/DD/YY,[\s+]mm[\s+]HH[\s+]YYYY[.*]"),
+)
+
+# Index into _DATE_FORMATS of the most recent successful fallback parse
+_last_date_format = [0]
+
+# Most likely format for a Date header, keyed on whether it has a comma in the
+# first five characters, a slash in the first six, and a leading digit
+_DATE_FORMAT_BY_SHAPE = {
+    shape: [date_format for _, date_format in _DATE_FORMATS].index(date_format)
+    for shape, date_format in {
+        (True, False, False): "%a, %d %b %Y %H:%M:%S %z",
+        (False, False, False): "%a %d %b %Y %H:%M:%S %z",
+        (False, False, True): "%d %b %Y %H:%M:%S %z",
+        (False, True, True): "%m/%d/%y, %H:%M",
+    }.items()
+}
+
+
+@functools.lru_cache(maxsize=16384)
+def _clean_header_cached(header):
+    # Senders and subjects repeat heavily across a mailbox, so memoize decoding
+    return str(make_header(decode_header(_WS_RE.sub(" ", header))))
+
+
+@functools.lru_cache(maxsize=16384)
+def _parse_date(date):
+    # Threads often repeat the exact same Date header, so results are memoized.
+    # Most Date headers are RFC 2822, which the stdlib parses directly
+    with contextlib.suppress(ValueError, TypeError, IndexError, AttributeError):
+        return _as_utc(parsedate_to_datetime(date))
+
+    # Try the format suggested by the header's leading characters, then the last
+    # one that worked (mailboxes tend to reuse one format), then the rest
+    shape = ("," in date[:5], "/" in date[:6], date[:1].isdigit())
+    candidates = dict.fromkeys(
+        [_DATE_FORMAT_BY_SHAPE.get(shape, 0), _last_date_format[0]]
+    )
+    candidates.update(dict.fromkeys(range(len(_DATE_FORMATS))))
+    for index in candidates:
+        parser, date_format = _DATE_FORMATS[index]
+        try:
+            parsed_date = parser(date, date_format)
+        except (ValueError, TypeError):
+            continue
+        _last_date_format[0] = index
+        return _as_utc(parsed_date)
+
+    return None
+
+
+def _as_utc(date):
+    # Dates without a timezone are treated as UTC, matching arrow's behavior
+    if date.tzinfo is None:
+        return date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+@functools.lru_cache(maxsize=16384)
+def _parse_from_address(from_address):
+    # Each distinct From header is only parsed once; failures are not cached
+    match = _ADDRESS_RE.fullmatch(from_address)
+    if match:
+        name = match["quoted"] or match["name"] or ""
+        email_address = match["bracketed"] or match["bare"]
+    else:
+        name, email_address = parseaddr(from_address)
+    if "@" not in email_address:
+        # Fall back to flanker's full RFC 5322 parser for anything parseaddr can't handle
+        parsed = address.parse(from_address)
+        name, email_address = parsed.display_name, parsed.address
+    # Senders and their domains repeat heavily, so share one string object each
+    email_address = sys.intern(email_address.lower())
+    return name, email_address, sys.intern(email_address.rpartition("@")[2])
+
 
 class Email:
+    __slots__ = (
+        "valid_date",
+        "valid_headers",
+        "from_address",
+        "from_address_email",
+        "from_address_name",
+        "from_address_host",
+        "to_address",
+        "subject",
+        "date",
+        "date_ts",
+        "date_mdy",
+        "year",
+        "passed_filters",
+        "filter_reason",
+        "filter_value",
+    )
+
     def __init__(self, subject, from_address, to_address, date):
         self.valid_date = True
         self.valid_headers = True
-        self.from_address = address.parse(self._clean_header(from_address))
-        self.from_address_email = self.from_address.address.lower()
-        self.from_address_name = self.from_address.display_name
-        self.from_address_host = self.from_address.hostname.lower()
+        (
+            self.from_address_name,
+            self.from_address_email,
+            self.from_address_host,
+        ) = _parse_from_address(self._clean_header(from_address))
+        self.from_address = (
+            f"{self.from_address_name} <{self.from_address_email}>"
+            if self.from_address_name
+            else self.from_address_email
+        )
         self.to_address = self._clean_header(to_address)
         self.subject = self._clean_header(subject)
-        self.date = self._validate_date(date)
-        self.year = self._find_year(self.date)
-        self.us_date = self.date.format("M/D/YY")
+        self.date = date
+        self.date_ts = None
+        self.date_mdy = None
+        self.year = None
+        self._validate_date(date)
         self.passed_filters = None
         self.filter_reason = None
         self.filter_value = None
 
-    def _validate_date(self, date):
-        date_formats = [
-            r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]Z",
-            r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]ZZZ",
-            r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]",
-            r"ddd,[\s+]DD[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss",
-            r"ddd[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm:ss[\s+]Z",
-            r"D[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss[\s+]Z",
-            r"ddd,[\s+]D[\s+]MMM[\s+]YYYY[\s+]H:mm[\s+]Z",
-            r"MM/D/YY,[\s+]H[\s+]mm[.*]",
-            r"M/D/YY,[\s+]H:m",
-            r"DD[\s+]MMM[\s+]YYYY[\s+]HH:mm:ss",
-            r"MM/DD/YY,[\s+]mm[\s+]HH[\s+]YYYY[.*]",
-        ]
+    @property
+    def us_date(self):
+        # Only formatted for emails that are actually exported
+        if not self.valid_date:
+            return self.date
+        month, day, year = self.date_mdy
+        return f"{month}/{day}/{year % 100:02d}"
 
-        arrow_date = None
-        for date_format in date_formats:
-            try:
-                arrow_date = arrow.get(date, date_format)
-                break
-            except:
-                continue
-        if not arrow_date:
+    def _validate_date(self, date):
+        # Keep only plain ints from the parsed date, not the datetime object
+        parsed_date = _parse_date(date) if isinstance(date, str) else None
+        if parsed_date is None:
             self.valid_date = False
-            return date
-        else:
-            return arrow_date
-
-    def _find_year(self, date):
-        if isinstance(date, arrow.Arrow):
-            return date.year
-        else:
-            return None
+            return
+        self.date_ts = int(parsed_date.timestamp())
+        self.year = parsed_date.year
+        self.date_mdy = (parsed_date.month, parsed_date.day, parsed_date.year)
 
     def _clean_header(self, header):
+        if not header:
+            return ""
+        # Plain headers without encoded words or folded whitespace are already clean
+        if isinstance(header, str) and not _NEEDS_CLEANING_RE.search(header):
+            return header
         try:
-            return (
-                str(make_header(decode_header(re.sub(r"\s\s+", " ", header))))
-                if header
-                else ""
-            )
-        except:
+            return _clean_header_cached(header)
+        except (HeaderParseError, UnicodeDecodeError, LookupError, TypeError):
             self.valid_headers = False
             return header
 
     def filtered_iterable(self):
-        return iter(
-            [
-                self.subject,
-                self.from_address_name,
-                self.from_address_email,
-                self.to_address,
-                self.us_date,
-                self.filter_reason,
-                self.filter_value,
-            ]
-        )
+        return iter(self.row() + (self.filter_reason, self.filter_value))
 
     def __str__(self):
         out_str = [
@@ -105,83 +244,225 @@ class Email:
             ]
         return "\n".join(out_str)
 
+    def row(self, include_subject=True):
+        return (_get_row if include_subject else _get_row_without_subject)(self)
+
     def __iter__(self):
-        return iter(
-            [
-                self.subject,
-                self.from_address_name,
-                self.from_address_email,
-                self.to_address,
-                self.us_date,
+        return iter(self.row())
+
+
+# Export columns, read off each Email in C by attrgetter
+_EXPORT_FIELDS = (
+    "subject",
+    "from_address_name",
+    "from_address_email",
+    "to_address",
+    "us_date",
+)
+_get_row = attrgetter(*_EXPORT_FIELDS)
+_get_row_without_subject = attrgetter(*_EXPORT_FIELDS[1:])
+
+
+def _parse_headers(header_bytes):
+    message = _HEADER_PARSER.parsebytes(header_bytes)
+    return message["Subject"], message["From"], message["To"], message["Date"]
+
+
+def _next_message_start(mbox_map, position):
+    index = mbox_map.find(b"\nFrom ", position)
+    return -1 if index == -1 else index + 1
+
+
+def _iter_message_starts(mbox_map, start=0, end=None):
+    # Messages begin at any line starting with "From ", as in mailbox.mbox
+    end = len(mbox_map) if end is None else end
+    if mbox_map[start : start + 5] == b"From " and (
+        start == 0 or mbox_map[start - 1 : start] == b"\n"
+    ):
+        position = start
+    else:
+        position = _next_message_start(mbox_map, start)
+
+    while position != -1 and position < end:
+        yield position
+        position = _next_message_start(mbox_map, position)
+
+
+@contextlib.contextmanager
+def _map_mbox(mbox_filename):
+    with open(mbox_filename, "rb") as mbox_file:
+        # mmap can't map an empty file
+        if not os.fstat(mbox_file.fileno()).st_size:
+            yield b""
+            return
+        with mmap.mmap(mbox_file.fileno(), 0, access=mmap.ACCESS_READ) as mbox_map:
+            yield mbox_map
+
+
+def iter_mbox_header_blocks(mbox_filename, start=0, end=None):
+    # Yields the raw header block of each message; bodies are never read.
+    # Message and header boundaries are located with find() over a memory map,
+    # so nothing is scanned line by line.
+    with _map_mbox(mbox_filename) as mbox_map:
+        for position in _iter_message_starts(mbox_map, start, end):
+            limit = _next_message_start(mbox_map, position)
+            if limit == -1:
+                limit = len(mbox_map)
+
+            from_line_end = mbox_map.find(b"\n", position, limit)
+            if from_line_end == -1:
+                yield b""
+                continue
+
+            blank_lines = [
+                index
+                for index in (
+                    mbox_map.find(b"\n\n", from_line_end, limit),
+                    mbox_map.find(b"\n\r\n", from_line_end, limit),
+                )
+                if index != -1
             ]
-        )
+            header_end = min(blank_lines) + 1 if blank_lines else limit
+            yield mbox_map[from_line_end + 1 : header_end]
 
 
-def process_mbox(mbox_filename):
+def find_message_offsets(mbox_filename):
+    with _map_mbox(mbox_filename) as mbox_map:
+        return list(_iter_message_starts(mbox_map))
+
+
+def _process_range(byte_range, report_progress=False):
+    mbox_filename, start, end = byte_range
     count = 0
     emails = []
+    failed_headers = []
+    done = threading.Event()
+
+    def print_progress():
+        # Report from a background thread so the parse loop never writes to stdout
+        while not done.wait(PROGRESS_INTERVAL):
+            print(f"  {count} emails processed.")
+
+    if report_progress:
+        threading.Thread(target=print_progress, daemon=True).start()
+
+    try:
+        for header_block in iter_mbox_header_blocks(mbox_filename, start, end):
+            count += 1
+            try:
+                emails.append(Email(*_parse_headers(header_block)))
+            except:
+                # Keep the raw block, since 8-bit headers parse to Header objects
+                # that don't print their text
+                failed_headers.append(header_block)
+    finally:
+        done.set()
+
+    # Failures are returned rather than logged, since logging isn't configured
+    # in worker processes started with spawn (Windows and macOS)
+    return emails, count, failed_headers
+
+
+def _log_failed_headers(failed_headers):
+    # Report failures in one write rather than interleaving them with parsing
+    if failed_headers:
+        logger.warning(
+            "Unable to process %d email(s). Logging details:\n%s\n",
+            len(failed_headers),
+            "\n\n".join(
+                header_block.decode("utf-8", "replace").rstrip()
+                for header_block in failed_headers
+            ),
+        )
 
-    for message in mailbox.mbox(mbox_filename):
-        count += 1
-        try:
-            emails.append(
-                Email(
-                    message["Subject"], message["From"], message["To"], message["Date"]
-                )
-            )
-        except:
-            print("Unable to process email. Logging details:")
-            print(message)
-            print("")
 
-        if count % 1000 == 0:
+def process_mbox(mbox_filename):
+    offsets = find_message_offsets(mbox_filename)
+
+    # Small mailboxes aren't worth the cost of starting worker processes
+    if len(offsets) < PARALLEL_THRESHOLD:
+        emails, count, failed_headers = _process_range(
+            (mbox_filename, 0, None), report_progress=True
+        )
+        _log_failed_headers(failed_headers)
+        return emails, count
+
+    # Split messages into one contiguous byte range per core
+    num_workers = os.cpu_count() or 1
+    if sys.platform == "win32":
+        num_workers = min(num_workers, WINDOWS_MAX_WORKERS)
+    starts = [
+        int(chunk[0]) for chunk in numpy.array_split(offsets, num_workers) if len(chunk)
+    ]
+    byte_ranges = [
+        (mbox_filename, start, end) for start, end in zip(starts, starts[1:] + [None])
+    ]
+
+    count = 0
+    emails = []
+    failed_headers = []
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        # map yields results in submission order, keeping emails in file order
+        for chunk_emails, chunk_count, chunk_failed in executor.map(
+            _process_range, byte_ranges
+        ):
+            emails.extend(chunk_emails)
+            count += chunk_count
+            failed_headers.extend(chunk_failed)
             print(f"  {count} emails processed.")
 
+    _log_failed_headers(failed_headers)
+
     return emails, count
 
 
-def check_against_filters(email, filters):
+def make_filter_checker(filters):
+    # Bind the filter sets once so the per-email check only touches locals
     domains = filters["domains"]
     emails = filters["emails"]
-    keywords = filters["keywords"]
+    keyword_search = filters["keyword_search"]
     staff = filters["staff"]
 
-    if email.from_address_host in domains:
-        email.passed_filters = False
-        email.filter_reason = "Domain in filter list"
-        email.filter_value = email.from_address_host
-    elif email.from_address_host.count(".") > 1:
-        parent_domain = ".".join(email.from_address_host.split(".")[-2:])
-        if parent_domain in domains:
+    def check_against_filters(email):
+        host = email.from_address_host
+        # Last two labels of the host, sliced without splitting into a list
+        parent_domain = host[host.rfind(".", 0, host.rfind(".")) + 1 :]
+
+        if host in domains:
+            email.passed_filters = False
+            email.filter_reason = "Domain in filter list"
+            email.filter_value = host
+        elif parent_domain != host and parent_domain in domains:
             email.passed_filters = False
             email.filter_reason = "Parent domain in filter list"
-            email.filter_value = email.from_address_host
-    elif email.from_address_email in staff:
-        email.passed_filters = False
-        email.filter_reason = "Staff"
-        email.filter_value = email.from_address_email
-    elif email.from_address_email in emails:
-        email.passed_filters = False
-        email.filter_reason = "Email address in filter list"
-        email.filter_value = email.from_address_email
-    elif any([keyword in email.subject for keyword in keywords]):
-        email.passed_filters = False
-        email.filter_reason = "Subject contains keyword in filter list"
-        email.filter_value = email.subject
-    else:
-        email.passed_filters = True
+            email.filter_value = host
+        elif email.from_address_email in staff:
+            email.passed_filters = False
+            email.filter_reason = "Staff"
+            email.filter_value = email.from_address_email
+        elif email.from_address_email in emails:
+            email.passed_filters = False
+            email.filter_reason = "Email address in filter list"
+            email.filter_value = email.from_address_email
+        elif keyword_search(email.subject.lower()):
+            email.passed_filters = False
+            email.filter_reason = "Subject contains keyword in filter list"
+            email.filter_value = email.subject
+        else:
+            email.passed_filters = True
 
-    return email
+        return email
+
+    return check_against_filters
 
 
 def validate_and_sort_emails(emails, year=None, filters=False):
     if year:
         print(f"Excluding emails not from year {year}.", "\n")
 
-    if filters:
-        emails = [check_against_filters(email, filters) for email in emails]
+    check_against_filters = make_filter_checker(filters) if filters else None
 
-    # Check if emails had valid dates and headers
+    # Validate, filter, and partition emails in a single pass
     valid_emails = []
     bad_formats = []
     filtered_emails = []
@@ -193,47 +474,52 @@ def validate_and_sort_emails(emails, year=None, filters=False):
             email.passed_filters = False
             email.filter_reason = "Incorrect Year"
             email.filter_value = email.year
-            filtered_emails.append(email)
-        elif filters and not email.passed_filters:
-            filtered_emails.append(email)
+            # Wrong-year emails are only reported when filters aren't applied
+            if not filters:
+                filtered_emails.append(email)
+        elif filters and not check_against_filters(email).passed_filters:
+            # Staff emails are dropped rather than reported as filtered
+            if email.filter_reason != "Staff":
+                filtered_emails.append(email)
         else:
             valid_emails.append(email)
 
     if filters:
-        # Remove staff emails from filtered emails
-        filtered_emails = [
-            email
-            for email in filtered_emails
-            if email.filter_reason not in ("Staff", "Incorrect Year")
-        ]
-        filtered_emails = sorted(filtered_emails, key=lambda x: x.date)
+        filtered_emails = sorted(filtered_emails, key=attrgetter("date_ts"))
 
     # Sort valid emails based on datetime
-    valid_emails = sorted(valid_emails, key=lambda x: x.date)
+    valid_emails = sorted(valid_emails, key=attrgetter("date_ts"))
 
     return valid_emails, bad_formats, filtered_emails
 
 
 def export_csv(output_filename, data, headers=[]):
-    with open(output_filename, "w", newline="", encoding="utf-8") as out_file:
+    with open(
+        output_filename, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER_SIZE
+    ) as out_file:
         writer = csv.writer(out_file, quoting=csv.QUOTE_MINIMAL)
 
         if headers:
             writer.writerow(headers)
-        writer.writerows(data)
+
+        # Write in fixed-size batches so rows are never all materialized at once
+        rows = iter(data)
+        while batch := list(itertools.islice(rows, WRITE_BATCH_SIZE)):
+            writer.writerows(batch)
 
     return output_filename
 
 
 def export_emails(emails, output_filename, exclude_subject=False):
     headers = ["Subject", "Gmail Name", "From Email", "To", "Date"]
+    get_row = _get_row
 
     if exclude_subject:
         print("Excluding email Subject field from export.")
         headers = headers[1:]
-        emails = [list(email)[1:] for email in emails]
+        get_row = _get_row_without_subject
 
-    export_csv(output_filename, emails, headers)
+    export_csv(output_filename, map(get_row, emails), headers)
 
     return output_filename
 
@@ -248,7 +534,7 @@ def export_filtered_emails(filtered_emails, output_filename):
         "Filter Reason",
         "Filter Value",
     ]
-    filtered_emails = [email.filtered_iterable() for email in filtered_emails]
+    filtered_emails = (email.filtered_iterable() for email in filtered_emails)
     export_csv(output_filename, filtered_emails, headers)
 
     return output_filename
@@ -256,12 +542,18 @@ def export_filtered_emails(filtered_emails, output_filename):
 
 def export_bad_emails(bad_formats, output_filename):
     headers = ["Filter reason", "Data"]
-    bad_formats_export = []
-    for email in bad_formats:
-        if not email.valid_date:
-            bad_formats_export.append(["Incorrect Date Format", email.date])
-        if not email.valid_headers:
-            bad_formats_export.append(["Incorrect Header Format", email.header])
+    bad_formats_export = itertools.chain(
+        (
+            ("Incorrect Date Format", email.date)
+            for email in bad_formats
+            if not email.valid_date
+        ),
+        (
+            ("Incorrect Header Format", email.subject)
+            for email in bad_formats
+            if not email.valid_headers
+        ),
+    )
 
     export_csv(output_filename, bad_formats_export, headers)
 
@@ -269,39 +561,18 @@ def export_bad_emails(bad_formats, output_filename):
 
 
 def export_filter_stats(emails, output_filename):
-    filtered_for_domains = [
-        email
+    domain_filter_counts = Counter(
+        email.from_address_host
         for email in emails
         if email.filter_reason
         in ("Domain in filter list", "Parent domain in filter list")
-    ]
-    filtered_emails_domains = [
-        email.from_address_host for email in filtered_for_domains
-    ]
-    filtered_domains = set(filtered_emails_domains)
-    domain_filter_counts = {
-        domain: filtered_emails_domains.count(domain) for domain in filtered_domains
-    }
-    domain_filter_counts = sorted(
-        domain_filter_counts.items(), key=lambda x: x[1], reverse=True
-    )
+    ).most_common()
 
-    filtered_for_email_address = [
-        email
+    email_address_filter_counts = Counter(
+        email.from_address
         for email in emails
         if email.filter_reason == "Email address in filter list"
-    ]
-    filtered_emails_addresses = [
-        email.from_address for email in filtered_for_email_address
-    ]
-    filtered_email_addresses = set(filtered_emails_addresses)
-    email_address_filter_counts = {
-        email_address: filtered_emails_addresses.count(email_address)
-        for email_address in filtered_email_addresses
-    }
-    email_address_filter_counts = sorted(
-        email_address_filter_counts.items(), key=lambda x: x[1], reverse=True
-    )
+    ).most_common()
 
     export_data = (
         [["Domain", "Number of emails filtered"]]
@@ -359,9 +630,18 @@ def main():
         help="Exclude the Subject field from export file\n\nThis will reduce the amount of personal information, but make identifying unknown senders more difficult.",
         default=False,
     )
+    parser.add_argument(
+        "-rf",
+        "--refreshfilters",
+        metavar="Refresh Filters",
+        action="store_true",
+        help="Reload filters from Quickbase instead of using filters cached in the last few hours.",
+        default=False,
+    )
 
     start_time = timeit.default_timer()
     args = parser.parse_args()
+    logging.basicConfig(stream=sys.stdout, format="%(message)s", level=logging.INFO)
     mailbox_filename = args.mbox
     output_filename = mailbox_filename.replace(".mbox", ".csv")
     year = int(args.year)
@@ -371,9 +651,8 @@ def main():
 
     if run_filters:
         # Load filter lists
-        print("Loading updated filters from Quickbase.")
         filter_start_time = timeit.default_timer()
-        filters = load_filters()
+        filters = load_filters(refresh=args.refreshfilters)
         if not filters:
             print(
                 "ERROR: Could not retrieve filters from Quickbase. Export will not be filtered."
@@ -427,4 +706,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
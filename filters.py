@@ -1,15 +1,138 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 
 import keys
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+CACHE_FILENAME = os.path.join(os.path.expanduser("~"), ".clog_filters_cache.json")
+CACHE_MAX_AGE = 6 * 60 * 60
+
+# Query body with only the table and column ids left to fill in
+QUERY_TEMPLATE = (
+    b'{"from": %s, "select": [%s], "where": "{%s.XEX.\'\'}", '
+    b'"options": {"skip": 0, "top": 0, "compareWithAppLocalTime": false}}'
+)
+
+
+def _load_cached_filters(source):
+    # Returns (filters, age in seconds), or None if the cache is missing, too old,
+    # or was downloaded from a different realm or set of tables
+    try:
+        age = time.time() - os.path.getmtime(CACHE_FILENAME)
+        if age > CACHE_MAX_AGE:
+            return None
+        with open(CACHE_FILENAME, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+        if cache["source"] != source:
+            return None
+        filters = {name: set(values) for name, values in cache["filters"].items()}
+        return filters, age
+    except (OSError, ValueError, AttributeError, TypeError, KeyError):
+        return None
+
+
+def _save_cached_filters(filters, source):
+    try:
+        with open(CACHE_FILENAME, "w", encoding="utf-8") as cache_file:
+            json.dump(
+                {
+                    "source": source,
+                    "filters": {
+                        name: sorted(values) for name, values in filters.items()
+                    },
+                },
+                cache_file,
+            )
+    except OSError:
+        print("Could not write filter cache. Filters will be reloaded next run.")
+
+
+def _prepare_filters(filters):
+    # Normalize once here so lookups never need to strip or lowercase
+    filters = {
+        name: frozenset(value.strip().lower() for value in values if value.strip())
+        for name, values in filters.items()
+    }
+
+    filters["keyword_search"] = _build_keyword_search(filters["keywords"])
+
+    return filters
 
-def load_filters():
-    filters = {}
 
+def _build_keyword_search(keywords):
+    # Returns a function that tests a subject against every keyword in a single
+    # pass, using an Aho-Corasick automaton if available or a regex alternation
+    if not keywords:
+        return lambda subject: False
+
+    if ahocorasick:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return lambda subject: next(automaton.iter(subject), None) is not None
+
+    keywords_re = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+    return keywords_re.search
+
+
+def _fetch_filter(session, table_id, column_id):
+    body = QUERY_TEMPLATE % (
+        json.dumps(table_id).encode(),
+        json.dumps(column_id).encode(),
+        str(column_id).encode(),
+    )
+
+    # Make API call
+    try:
+        r = session.post(
+            f"https://api.quickbase.com/v1/records/query",
+            data=body,
+        )
+    except requests.ConnectionError:
+        print("Could not make connection to Quickbase. Check internet connection.")
+        return None
+
+    # Check if request successfully returned
+    try:
+        r.raise_for_status()
+    except requests.HTTPError:
+        print("Quickbase servers returned invalid HTTP code.")
+        print(f"{r.ok=}")
+        print(f"{r.status_code=}")
+        return None
+
+    # Access the data we want
+    try:
+        return set(
+            record[column_id]["value"] for record in json_loads(r.content)["data"]
+        )
+    except (KeyError, ValueError):
+        print("JSON returned from Quickbase API could not be decoded.")
+        return None
+
+
+def load_filters(refresh=False):
     headers = {
         "QB-Realm-Hostname": keys.QB_REALM_HOSTNAME,
         "User-Agent": keys.USER_AGENT,
         "Authorization": keys.TOKEN,
+        "Content-Type": "application/json",
     }
 
     qb_ids = [
@@ -35,44 +158,44 @@ def load_filters():
         ],
     ]
 
-    for table_id, column_id, name in qb_ids:
-        body = {
-            "from": table_id,
-            "select": [column_id],
-            "where": f"{{{column_id}.XEX.''}}",
-            "options": {"skip": 0, "top": 0, "compareWithAppLocalTime": False},
-        }
-
-        # Make API call
-        try:
-            r = requests.post(
-                f"https://api.quickbase.com/v1/records/query",
-                headers=headers,
-                json=body,
-            )
-        except requests.ConnectionError:
-            print("Could not make connection to Quickbase. Check internet connection.")
-            return None
+    # Cached filters are only valid for the realm and tables they came from
+    source = [keys.QB_REALM_HOSTNAME, qb_ids]
 
-        # Check if request successfully returned
-        try:
-            r.raise_for_status()
-        except requests.HTTPError:
-            print("Quickbase servers returned invalid HTTP code.")
-            print(f"{r.ok=}")
-            print(f"{r.status_code=}")
-            return None
+    # Reuse recently downloaded filters rather than querying Quickbase every run
+    cached = None if refresh else _load_cached_filters(source)
+    if cached:
+        filters, age = cached
+        print(
+            f"Using filters cached {round(age / 60)} minute(s) ago. "
+            "Check Refresh Filters (--refreshfilters) to reload from Quickbase."
+        )
+        return _prepare_filters(filters)
+
+    print("Loading updated filters from Quickbase.")
 
-        # Access the data we want, add to filters dict
-        try:
-            filters[name] = set(
-                record[column_id]["value"].lower() for record in r.json()["data"]
+    # Query all tables concurrently over one pooled keep-alive session
+    with requests.Session() as session, ThreadPoolExecutor(
+        max_workers=len(qb_ids)
+    ) as executor:
+        session.headers.update(headers)
+        session.mount(
+            "https://", HTTPAdapter(pool_connections=1, pool_maxsize=len(qb_ids))
+        )
+        results = list(
+            executor.map(
+                lambda qb_id: _fetch_filter(session, qb_id[0], qb_id[1]), qb_ids
             )
-        except KeyError:
-            print("JSON returned from Quickbase API could not be decoded.")
+        )
+
+    filters = {}
+    for (table_id, column_id, name), result in zip(qb_ids, results):
+        if result is None:
             return None
+        filters[name] = result
 
-    return filters
+    _save_cached_filters(filters, source)
+
+    return _prepare_filters(filters)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import mailbox
+import os
+import tempfile
+import unittest
+from email.utils import parseaddr
+
+import clog
+
+
+def _message(sender, subject, body="Body line\n\n>From a quoted line\n"):
+    return (
+        f"From {sender} Mon Jan  4 10:00:00 2021\n"
+        f"From: Sender <{sender}>\n"
+        f"To: someone@example.com\n"
+        f"Subject: {subject}\n"
+        f"Date: Mon, 4 Jan 2021 10:00:00 +0000\n"
+        f"\n"
+        f"{body}\n"
+    )
+
+
+MBOX_CASES = {
+    "lf": _message("a@example.com", "First") + _message("b@example.com", "Second"),
+    "crlf": (
+        _message("a@example.com", "First") + _message("b@example.com", "Second")
+    ).replace("\n", "\r\n"),
+    "leading lines": "Not a message\nStill not\n" + _message("a@example.com", "Only"),
+    "empty": "",
+    "no header terminator": _message("a@example.com", "First")
+    + "From c@example.com Mon Jan  4 10:00:00 2021\nFrom: c@example.com\nSubject: Cut",
+    "folded header": _message("a@example.com", "Folded\n continued subject"),
+}
+
+
+class IterMboxHeaderBlocksTest(unittest.TestCase):
+    # The mmap scanner must see the same messages and headers as mailbox.mbox
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_mbox(self, contents):
+        path = os.path.join(self.tmpdir.name, "test.mbox")
+        with open(path, "wb") as mbox_file:
+            mbox_file.write(contents.encode("utf-8"))
+        return path
+
+    def expected_headers(self, path):
+        mbox = mailbox.mbox(path, create=False)
+        self.addCleanup(mbox.close)
+        return [
+            (message["Subject"], message["From"], message["To"], message["Date"])
+            for message in mbox
+        ]
+
+    def scanned_headers(self, path, start=0, end=None):
+        return [
+            clog._parse_headers(header_block)
+            for header_block in clog.iter_mbox_header_blocks(path, start, end)
+        ]
+
+    def test_matches_mailbox_mbox(self):
+        for name, contents in MBOX_CASES.items():
+            with self.subTest(name):
+                path = self.write_mbox(contents)
+                self.assertEqual(
+                    self.scanned_headers(path), self.expected_headers(path)
+                )
+
+    def test_byte_ranges_cover_every_message(self):
+        for name, contents in MBOX_CASES.items():
+            with self.subTest(name):
+                path = self.write_mbox(contents)
+                offsets = clog.find_message_offsets(path)
+                scanned = []
+                for start, end in zip(offsets, offsets[1:] + [None]):
+                    scanned += self.scanned_headers(path, start, end)
+                self.assertEqual(scanned, self.expected_headers(path))
+
+
+ADDRESS_CASES = [
+    "John Doe <jd@example.com>",
+    "jd@example.com",
+    "<jd@example.com>",
+    '"Doe, John" <jd@example.com>',
+    '"" <jd@example.com>',
+    "John.Doe <jd@example.com>",
+    "J. R. <jd@example.com>",
+    "J.R.<jd@example.com>",
+    "O'Neil <o@example.com>",
+    "José <j@example.com>",
+    "Jo Jo   <jd@example.com>",
+    "a..b@example.com",
+    "a+b@example.co.uk",
+    "a!#$%&*+/=?^_`{|}~-b@example.com",
+    "John <jd@example.com> extra",
+    "jd@example.com (John)",
+    "J  D <jd@example.com>",
+    "J\tD <jd@example.com>",
+    "J <jd@example.com",
+    '"J" jd@example.com',
+    '"J\\"x" <jd@example.com>',
+    '"a b" <"q"@example.com>',
+    "jd@[192.0.2.1]",
+    "x@y@z",
+    "x @example.com",
+    "John Doe",
+]
+
+
+class AddressRegexTest(unittest.TestCase):
+    # _ADDRESS_RE is a fast path for parseaddr and must never disagree with it
+    def test_agrees_with_parseaddr(self):
+        for from_address in ADDRESS_CASES:
+            with self.subTest(from_address):
+                match = clog._ADDRESS_RE.fullmatch(from_address)
+                if match:
+                    name = match["quoted"] or match["name"] or ""
+                    email_address = match["bracketed"] or match["bare"]
+                    self.assertEqual((name, email_address), parseaddr(from_address))
+
+    def test_matches_common_forms(self):
+        for from_address in ADDRESS_CASES[:14]:
+            with self.subTest(from_address):
+                self.assertIsNotNone(clog._ADDRESS_RE.fullmatch(from_address))
+
+
+if __name__ == "__main__":
+    unittest.main()